@@ -0,0 +1,236 @@
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba 为可选加速依赖，未安装时内核按纯 NumPy 运行
+    njit = None
+
+# ==========================================
+# 1. 核心物理引擎：MENEX_HA 模型 (Błażejczyk et al. 2024)
+# ==========================================
+# 与 Streamlit 页面脚本分离：页面每次重跑都会重新执行脚本本身，
+# 而本模块只在首次 import 时加载，常量数组与模板在进程内复用
+
+# 仿真时长 (分钟) 与共享的只读时间轴 (0..DURATION，含初始时刻，与历史数组等长)
+DURATION = 120
+TIME_POINTS = np.arange(DURATION + 1)
+TIME_POINTS.flags.writeable = False
+
+# 人体组织比热 (J/kg/K) 与核心区质量 (kg)
+SPECIFIC_HEAT = 3470.0
+CORE_MASS = 50.0
+
+# 人体分段参数 (SoA 布局: 各数组按 SEG_NAMES 顺序存放六个部位)
+SEG_NAMES = ("Head", "Trunk", "Arms", "Hands", "Legs", "Feet")
+SEG_IDX = {name: i for i, name in enumerate(SEG_NAMES)}
+SEG_MASS = np.array([4.5, 30.0, 4.0, 0.4, 12.0, 1.0])
+SEG_AREA = np.array([0.14, 0.55, 0.26, 0.08, 0.60, 0.14])
+SEG_VASO = np.array([0.2, 0.1, 0.8, 3.0, 0.8, 3.0])
+SEG_SOLAR_W = np.array([0.3, 0.5, 0.2, 0.0, 0.4, 0.0])
+# 头部手部衣物覆盖修正
+SEG_CLO_MULT = np.array([0.3, 1.0, 1.0, 0.3, 1.0, 1.0])
+# 分配代谢热：躯干和腿分得多
+SEG_MET_RATIO = np.array([0.1, 0.35, 0.1, 0.1, 0.35, 0.1])
+
+def simulate_kernel(env_temp, v_eff, solar_rad, clo, is_wet, real_m, q_res, hypoxia, skin_hist, core_hist):
+    # 数值内核：整段时间积分只使用标量与定长数组，不触碰 dict / list
+    # 结果按下标原地写入调用方预分配的 skin_hist (6 x (duration+1)) 与 core_hist (duration+1)，
+    # 第 0 列为初始状态。历史可为 float32 存储，积分状态始终以 float64 计算
+    duration = core_hist.shape[0] - 1
+    skin = skin_hist[:, 0].astype(np.float64)
+    core = float(core_hist[0])
+    
+    # 以下各项只依赖恒定输入，移出时间循环只算一次
+    # A. 太阳辐射收益 (Solar Gain) - Paper Eq 11
+    # 只有部分面积受光，且受衣物遮挡
+    # 简单模型：Radiation * Area * Absorptivity * (1/Clo)
+    # 衣服越厚，辐射收益越难进入皮肤，但衣服表面会热(此处简化为直接收益)
+    q_solar = solar_rad * SEG_AREA * SEG_SOLAR_W * 0.4
+    
+    # B. 对流与传导散热：热阻只取决于服装与风速
+    real_clo = clo * 0.35 if is_wet else clo
+    local_clo = real_clo * SEG_CLO_MULT
+    r_insulation = 0.155 * local_clo + 0.1 / (1 + 0.5 * v_eff)
+    conductance = SEG_AREA / r_insulation
+    
+    # 局部代谢热 + 太阳辐射：每步相同的恒定热源
+    q_const = real_m * SEG_MET_RATIO + q_solar
+    
+    # 血流换热系数 18/60 与每分钟热容 (J/K ÷ 60 s)
+    blood_coeff = 0.3 * SEG_MASS
+    seg_heat_cap = SEG_MASS * SPECIFIC_HEAT / 60
+    core_heat_cap = CORE_MASS * SPECIFIC_HEAT / 60
+    core_source = real_m - q_res
+    
+    for t in range(duration):
+        q_conv = conductance * (skin - env_temp)
+        
+        # C. 血液灌注 (逆流热交换)
+        # 核心 >= 36.8 时 delta 取 0，vaso 恰为 1.0，无需按部位分支
+        delta = max(0.0, 36.8 - core)
+        vaso = 1.0 / (1.0 + SEG_VASO * delta * 10.0) # 敏感度极高
+        q_blood = blood_coeff * vaso * (core - skin)
+        
+        # 局部热平衡 -> 更新皮温 (皮温不低于气温)
+        skin = np.maximum(skin + (q_const + q_blood - q_conv) / seg_heat_cap, env_temp)
+        skin_hist[:, t + 1] = skin
+        
+        # 4. 更新核心温度
+        # 核心 = 代谢产热 - 呼吸散热 - 血液冷却
+        # 太阳辐射对核心的直接影响较小，主要通过皮温传导
+        core += (core_source - q_blood.sum()) / core_heat_cap
+        # 寒战补偿 (极弱，因为高海拔缺氧限制了寒战能力)，以布尔值相乘代替分支
+        core += 0.001 * hypoxia * (core < 36.5)
+        
+        core_hist[t + 1] = core
+
+if njit is not None:
+    # 编译为本地代码；cache=True 把编译结果写入 __pycache__，新进程直接载入
+    simulate_kernel = njit(cache=True, fastmath=True)(simulate_kernel)
+
+class PhysiologyEngine:
+    def __init__(self, duration=DURATION):
+        # 状态初始化 (历史一次性预分配：皮温 6 x (duration+1)，核心 duration+1)
+        # 历史以 float32 存储：0.1°C 的显示精度绰绰有余，缓存与图表传输的数据量减半
+        self.skin_temp = np.full(len(SEG_NAMES), 33.0)
+        self.skin_hist = np.empty((len(SEG_NAMES), duration + 1), dtype=np.float32)
+        self.skin_hist[:, 0] = self.skin_temp
+        self.core_temp = 37.0
+        self.history_core = np.empty(duration + 1, dtype=np.float32)
+        self.history_core[0] = self.core_temp
+
+    def calc_altitude_pressure(self, altitude_m):
+        # 气压随海拔衰减公式 (hPa)
+        return 1013.25 * (1 - 2.25577e-5 * altitude_m) ** 5.25588
+
+    def calc_max_metabolism(self, altitude_m, has_o2_support):
+        # 论文 Eq 7-10: 缺氧导致 VO2max 下降，从而限制最大产热
+        # 海平面 VO2max 设为 57 ml/kg/min (训练有素的登山者)
+        sea_level_vo2 = 57.0 
+        
+        # 氧气辅助修正 (Mask)
+        effective_alt = altitude_m - 3000 if has_o2_support else altitude_m
+        if effective_alt < 0: effective_alt = 0
+        
+        # 简化的海拔衰减系数 (approx data from paper)
+        hypoxia_factor = 1.0
+        if effective_alt > 1500:
+            hypoxia_factor = 1.0 - (effective_alt - 1500) / 7500.0
+        if hypoxia_factor < 0.2: hypoxia_factor = 0.2
+        
+        # 最大代谢率限制 (W)
+        # 基准最大产热 ~ 1000W (高强度), 随缺氧下降
+        max_met_w = 1000.0 * hypoxia_factor
+        return max_met_w, hypoxia_factor
+
+    def run(self, env, climber):
+        # env: {temp, wind, altitude, solar_rad}
+        # climber: {target_met, clo, is_wet, o2_support}
+        # 环境与攀登者参数在整个仿真中恒定，标量项只需计算一次，再交给数值内核积分
+        
+        ap = self.calc_altitude_pressure(env['altitude'])
+        max_met, hypoxia = self.calc_max_metabolism(env['altitude'], climber['o2_support'])
+        
+        # 1. 实际代谢产热 (M) - 受生理极限限制
+        # 用户设定的 METs * 基础代谢(约80W)
+        target_w = climber['target_met'] * 80.0
+        real_m = min(target_w, max_met) # 有心无力：想快走但缺氧走不动
+        
+        # 2. 呼吸热损失 (Respiration Heat Loss) - Paper Eq 32
+        # 高海拔过度通气 + 干燥空气 = 巨大热损
+        # 简化估算: Q_res 正比于 M 和 (37 - T_air)
+        # 高海拔系数：海拔越高，空气越干，呼吸量越大
+        ventilation_factor = 1.0 + (env['altitude'] / 3000.0)
+        q_res = 0.0015 * real_m * (37 - env['temp']) * ventilation_factor
+        
+        # 3. 各部位热平衡 + 核心体温 (逐分钟积分)
+        # 统一转为 float / bool，保证 JIT 内核只需编译一个类型签名
+        v_eff = env['wind'] * 0.6 if env['wind'] >= 5 else env['wind']
+        simulate_kernel(
+            float(env['temp']), float(v_eff), float(env['solar_rad']), float(climber['clo']),
+            bool(climber['is_wet']), float(real_m), float(q_res), float(hypoxia),
+            self.skin_hist, self.history_core
+        )
+        self.skin_temp = self.skin_hist[:, -1]
+        self.core_temp = self.history_core[-1]
+        
+        return {
+            "ap": ap,
+            "real_m": real_m,
+            "q_res": q_res,
+            "hypoxia": hypoxia
+        }
+
+if njit is not None:
+    # 预热：import 时完成 (或从磁盘缓存载入) JIT 编译，首次拖动滑块不再等待
+    PhysiologyEngine(1).run(
+        {"temp": 0.0, "wind": 0.0, "altitude": 0.0, "solar_rad": 0.0},
+        {"target_met": 1.0, "clo": 1.0, "is_wet": False, "o2_support": False}
+    )
+
+# ==========================================
+# 2. 可视化组件 (SVG + Iframe)
+# ==========================================
+# 皮温分级配色：阈值 (右闭) 与对应颜色，一次 searchsorted 完成六个部位的分级
+COLOR_BREAKS = np.array([0.0, 15.0, 25.0, 32.0, 35.0])
+COLOR_PALETTE = np.array(["#000000", "#1e1b4b", "#1d4ed8", "#60a5fa", "#fbbf24", "#ef4444"])
+
+# 头像静态部分：几何路径只标注部位 class，填充色取自 CSS 变量，描边规则集中定义一次
+AVATAR_SVG_STATIC = """
+        <style>
+            .seg { stroke: #333; stroke-width: 2; }
+            .head { fill: var(--c-head); } .trunk { fill: var(--c-trunk); } .arms { fill: var(--c-arms); }
+            .hands { fill: var(--c-hands); } .legs { fill: var(--c-legs); } .feet { fill: var(--c-feet); }
+            .label { font-family: Arial; font-weight: bold; }
+        </style>
+        <defs>
+            <linearGradient id="g" x1="0" x2="1"><stop offset="0" stop-color="#1e1b4b"/><stop offset="1" stop-color="#ef4444"/></linearGradient>
+        </defs>
+        
+        <!-- Head -->
+        <path class="seg head" d="M140,50 Q140,20 160,20 Q180,20 180,50 Q180,70 160,70 Q140,70 140,50 Z"/>
+        
+        <!-- Trunk -->
+        <path class="seg trunk" d="M130,70 L190,70 L200,200 L120,200 Z"/>
+        
+        <!-- Arms -->
+        <path class="seg arms" d="M130,70 L100,160 L120,170 L140,80 Z"/>
+        <path class="seg arms" d="M190,70 L220,160 L200,170 L180,80 Z"/>
+        
+        <!-- Hands -->
+        <path class="seg hands" d="M100,160 L90,190 L110,200 L120,170 Z"/>
+        <path class="seg hands" d="M220,160 L230,190 L210,200 L200,170 Z"/>
+        <line x1="90" y1="190" x2="50" y2="190" stroke="#666"/>
+        
+        <!-- Legs -->
+        <path class="seg legs" d="M120,200 L110,400 L150,400 L155,200 Z"/>
+        <path class="seg legs" d="M200,200 L210,400 L170,400 L165,200 Z"/>
+        
+        <!-- Feet -->
+        <path class="seg feet" d="M110,400 L100,430 L140,430 L150,400 Z"/>
+        <path class="seg feet" d="M210,400 L220,430 L180,430 L170,400 Z"/>
+        
+        <rect x="40" y="480" width="200" height="10" fill="url(#g)" rx="5"/>
+        <text x="40" y="505" font-size="10">Frozen</text><text x="240" y="505" font-size="10" text-anchor="end">Normal</text>
+"""
+
+def render_avatar(skin_temp):
+    # 颜色与温度先转为 Python str / float 局部变量，再直接写入 f-string：
+    # 模板随模块只编译一次，渲染时不再经过 str.format 的字段解析与 NumPy 标量格式化
+    cols = COLOR_PALETTE[np.searchsorted(COLOR_BREAKS, skin_temp, side="right")].tolist()
+    head_col, trunk_col, arms_col, hands_col, legs_col, feet_col = cols
+    head_t, trunk_t, _, hands_t, _, feet_t = np.asarray(skin_temp).tolist()
+    
+    # 动态部分只有六个 CSS 变量与四个温度标注
+    return f"""
+    <!DOCTYPE html>
+    <body style="margin:0; background:#fff; display:flex; justify-content:center;">
+    <svg width="280" height="520" viewBox="0 0 280 520" style="--c-head:{head_col}; --c-trunk:{trunk_col}; --c-arms:{arms_col}; --c-hands:{hands_col}; --c-legs:{legs_col}; --c-feet:{feet_col};">
+        {AVATAR_SVG_STATIC}
+        <text class="label" x="190" y="55" font-size="14">{head_t:.1f}°</text>
+        <text class="label" x="160" y="140" text-anchor="middle" fill="white">{trunk_t:.1f}</text>
+        <text class="label" x="10" y="190" font-size="14">{hands_t:.1f}°</text>
+        <text class="label" x="230" y="435" font-size="14">{feet_t:.1f}°</text>
+    </svg>
+    </body>
+    """